@@ -1,6 +1,13 @@
 import os
+import asyncio
+import copy
+import hashlib
+import json
+import threading
 import time
-import requests
+import collections
+import aiohttp
+import orjson
 from typing import Dict, Any, List, Optional
 from dotenv import load_dotenv
 
@@ -16,6 +23,12 @@ class AzureLLM:
         api_version: str = "2023-05-15",  # Default to a stable API version
         max_tokens: int = 1024,           # Default response limit that balances detail and cost
         temperature: float = 0.7,         # Default temperature for balanced creativity/determinism
+        cache_size: int = 256,            # Max entries kept in the exact-match response cache
+        exact_cache_max_temperature: float = 0.0,   # Exact cache active at/below this temperature
+        semantic_cache_max_temperature: float = 1.0,  # Semantic cache active at/below this temperature
+        max_batch: int = 1,               # Max prompts coalesced into one Azure request
+        batch_window: float = 0.015,      # Seconds to wait for more prompts before dispatch
+        cache_store=None,                 # Optional CacheStore persisting the cache to disk
         verbose: bool = False             # Toggles logging for debugging
     ):
         """
@@ -34,6 +47,20 @@ class AzureLLM:
             api_version: Azure OpenAI API version
             max_tokens: Maximum tokens to generate
             temperature: Sampling temperature
+            cache_size: Maximum number of responses held in the exact-match cache
+            exact_cache_max_temperature: Highest temperature at which the
+                       exact-match cache is consulted and filled (0.0 =
+                       deterministic output only)
+            semantic_cache_max_temperature: Highest temperature at which the
+                       semantic (paraphrase) cache is consulted and filled
+            max_batch: Maximum prompts coalesced into a single batched request.
+                       Defaults to 1 (micro-batching off) because batching
+                       rides the legacy completions API, which chat-only
+                       deployments such as gpt-4o do not serve; raise it only
+                       for deployments that accept the completions endpoint
+            batch_window: How long to buffer in-flight prompts before dispatch
+            cache_store: Optional app.cache_store.CacheStore; when given, the
+                         exact-match cache survives restarts
             verbose: Whether to print verbose output
         """
         # Load environment variables if not provided
@@ -61,35 +88,168 @@ class AzureLLM:
         # Ensure endpoint doesn't end with a slash
         # This prevents URL formatting issues when building request paths
         self.endpoint = self.endpoint.rstrip('/')
-    
+
+        # Precomputed request constants: the URLs and headers never change
+        # after construction, so build them once instead of per request
+        self._chat_url = f"{self.endpoint}/openai/deployments/{self.deployment_name}/chat/completions?api-version={self.api_version}"
+        self._completions_url = f"{self.endpoint}/openai/deployments/{self.deployment_name}/completions?api-version={self.api_version}"
+        self._headers = {
+            "Content-Type": "application/json",
+            "api-key": self.api_key,
+        }
+
+        # Exact-match response cache (LRU via OrderedDict move-to-end)
+        # Identical (messages, params) tuples are common in dev, tests, and RAG retries;
+        # a hit skips the full HTTPS round-trip and its Azure token cost.
+        # Only consulted at or below exact_cache_max_temperature (default 0,
+        # where output is deterministic).
+        self.cache_size = cache_size
+        self.exact_cache_max_temperature = exact_cache_max_temperature
+        self.semantic_cache_max_temperature = semantic_cache_max_temperature
+        self._cache = collections.OrderedDict()
+        self._cache_lock = threading.Lock()  # FastAPI serves requests from a thread pool
+
+        # Optional disk persistence: reload previous responses at startup so
+        # a redeploy doesn't re-pay Azure for answers we already have
+        self._cache_store = cache_store
+        if cache_store is not None:
+            for key, _, resp in cache_store.load("azure-exact")[-cache_size:]:
+                self._cache[key] = resp
+
+        # Optional semantic (embedding-similarity) cache, shared with LocalLLM.
+        # Injected by the application (see app/main.py) so both backends reuse
+        # the embedding model already loaded by VectorStore.
+        self.semantic_cache = None
+
+        # Pooled aiohttp session, created lazily on the first async call so the
+        # constructor stays usable outside an event loop. Connection reuse
+        # avoids a fresh TCP/TLS handshake per request under concurrent load.
+        self._session: Optional[aiohttp.ClientSession] = None
+
+        # Micro-batching state: concurrent agenerate() calls put their prompts
+        # on a queue; a background worker drains up to max_batch items within
+        # batch_window and issues one batched completions request. Created
+        # lazily on first use so the constructor works outside an event loop.
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self._batch_queue: Optional[asyncio.Queue] = None
+        self._batch_task: Optional[asyncio.Task] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared pooled session, creating it lazily."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=64,              # Cap concurrent connections to Azure
+                    ttl_dns_cache=300,     # Re-resolve the endpoint every 5 min
+                    keepalive_timeout=60,  # Keep warm connections for reuse
+                )
+            )
+        return self._session
+
+    async def aclose(self) -> None:
+        """Close the pooled session. Call from the application shutdown hook."""
+        if self._batch_task is not None and not self._batch_task.done():
+            self._batch_task.cancel()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def _cache_key(self, messages: List[Dict[str, str]]) -> str:
+        """
+        Build a stable cache key for a request payload.
+
+        The key is a SHA256 of the canonical (sorted-keys) JSON of everything
+        that influences the completion, so equal payloads always collide.
+
+        Args:
+            messages: Chat messages for the request
+
+        Returns:
+            Hex digest identifying the request payload
+        """
+        payload = {
+            "messages": messages,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "deployment": self.deployment_name,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def _cache_get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a cached response copy for the key, or None on miss."""
+        with self._cache_lock:
+            if key not in self._cache:
+                return None
+            # Move-to-end keeps recently used entries alive under LRU eviction
+            self._cache.move_to_end(key)
+            cached = copy.deepcopy(self._cache[key])
+        cached["source"] = "azure-cache"
+        cached["generation_time"] = 0
+        return cached
+
+    def _cache_put(self, key: str, response: Dict[str, Any]) -> None:
+        """Store a successful response under the key, evicting the LRU entry if full."""
+        with self._cache_lock:
+            self._cache[key] = copy.deepcopy(response)
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        # Persist asynchronously; a background thread does the actual write
+        if self._cache_store is not None:
+            self._cache_store.put("azure-exact", key, response)
+
     def generate(self, prompt: str, system_prompt: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Synchronous wrapper around agenerate() for non-async callers.
+
+        Async-aware callers (the FastAPI handlers) should await agenerate()
+        directly so the Azure round-trip doesn't block the event loop.
+
+        The session and batch worker are bound to the event loop they were
+        created on, and asyncio.run closes its loop on exit - reusing them on
+        a later call would raise "Event loop is closed". Each call therefore
+        runs against fresh loop-bound state, closes it before the loop dies,
+        and restores whatever was there before.
+
+        Args:
+            prompt: User prompt
+            system_prompt: Optional system message
+
+        Returns:
+            Response with generated text and metadata
+        """
+        async def _generate_isolated() -> Dict[str, Any]:
+            saved = (self._session, self._batch_queue, self._batch_task)
+            self._session = None
+            self._batch_queue = None
+            self._batch_task = None
+            try:
+                return await self.agenerate(prompt, system_prompt)
+            finally:
+                await self.aclose()
+                self._session, self._batch_queue, self._batch_task = saved
+
+        return asyncio.run(_generate_isolated())
+
+    async def agenerate(self, prompt: str, system_prompt: Optional[str] = None) -> Dict[str, Any]:
         """
         Generate a completion for a prompt using Azure OpenAI.
-        
+
         Design decisions:
         - Supports system prompts for better control over model behavior
+        - Non-blocking: concurrent requests overlap on the event loop and
+          reuse pooled TCP/TLS connections instead of serializing
         - Measures generation time for monitoring/optimization
         - Robust error handling with informative messages
         - Returns structured response with metadata for downstream processing
-        
+
         Args:
             prompt: User prompt
             system_prompt: Optional system message
-            
+
         Returns:
             Response with generated text and metadata
         """
-        # Track performance for monitoring and optimization
-        start_time = time.time()
-        
-        # Set up request headers following Azure best practices
-        # Content-Type ensures proper request parsing
-        # api-key header is the recommended auth method for Azure OpenAI
-        headers = {
-            "Content-Type": "application/json",
-            "api-key": self.api_key,
-        }
-        
         # Construct messages array in OpenAI chat format
         # System message provides instructions to guide the model's behavior
         # User message contains the actual query content
@@ -97,11 +257,48 @@ class AzureLLM:
         if system_prompt:
             messages.append({"role": "system", "content": system_prompt})
         messages.append({"role": "user", "content": prompt})
-        
-        # Construct Azure OpenAI API URL
-        # Format: {endpoint}/openai/deployments/{deployment}/chat/completions?api-version={version}
-        url = f"{self.endpoint}/openai/deployments/{self.deployment_name}/chat/completions?api-version={self.api_version}"
-        
+
+        # Short-circuit on an exact-match cache hit when the configured gate
+        # considers output at this temperature repeatable
+        cache_key = self._cache_key(messages)
+        if self.temperature <= self.exact_cache_max_temperature:
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                if self.verbose:
+                    print(f"Cache hit for prompt: {prompt[:50]}...")
+                return cached
+
+        # Optional debug logging
+        if self.verbose:
+            print(f"Calling Azure OpenAI API for prompt: {prompt[:50]}...")
+
+        # Route through the micro-batching queue when enabled; otherwise issue
+        # a single chat/completions request directly
+        if self.max_batch > 1:
+            result = await self._enqueue(prompt, system_prompt, messages)
+        else:
+            result = await self._post_chat(messages)
+
+        # Cache successful responses for future exact repeats when gated on
+        if (self.temperature <= self.exact_cache_max_temperature
+                and result.get("source") != "error"):
+            self._cache_put(cache_key, result)
+
+        return result
+
+    async def _post_chat(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        """
+        Issue a single chat/completions request to Azure OpenAI.
+
+        Args:
+            messages: Chat messages for the request
+
+        Returns:
+            Response with generated text and metadata
+        """
+        # Track performance for monitoring and optimization
+        start_time = time.time()
+
         # Set up request parameters
         # max_tokens limits response size for cost control
         # temperature affects randomness/creativity (0=deterministic, 1=creative)
@@ -110,35 +307,38 @@ class AzureLLM:
             "max_tokens": self.max_tokens,
             "temperature": self.temperature,
         }
-        
-        # Optional debug logging
-        if self.verbose:
-            print(f"Calling Azure OpenAI API for prompt: {prompt[:50]}...")
-        
+
         try:
             # Send request to Azure OpenAI with timeout for reliability
             # Using POST for chat completions API as per Azure docs
-            response = requests.post(url, headers=headers, json=request_data, timeout=60)
-            
-            # Raise exception for HTTP errors (4xx, 5xx)
-            response.raise_for_status()
-            
-            # Parse JSON response
-            response_data = response.json()
-            
+            session = self._get_session()
+            async with session.post(
+                self._chat_url,
+                headers=self._headers,
+                # orjson is a C-speed encoder; the Content-Type header is
+                # already application/json so raw bytes are equivalent
+                data=orjson.dumps(request_data),
+                timeout=aiohttp.ClientTimeout(total=60),
+            ) as response:
+                # Raise exception for HTTP errors (4xx, 5xx)
+                response.raise_for_status()
+
+                # Parse JSON response
+                response_data = await response.json()
+
             # Extract generated text from the response
             # The structure follows OpenAI's standard response format
             if "choices" in response_data and response_data["choices"]:
                 generated_text = response_data["choices"][0]["message"]["content"].strip()
             else:
                 generated_text = "No response generated."
-                
+
             # Calculate total processing time
             generation_time = time.time() - start_time
-            
+
             # Extract usage statistics for monitoring and cost management
             usage = response_data.get("usage", {})
-            
+
             # Return structured response with metadata
             return {
                 "response": generated_text,
@@ -149,55 +349,396 @@ class AzureLLM:
                 "completion_tokens": usage.get("completion_tokens", 0),
                 "total_tokens": usage.get("total_tokens", 0)
             }
-            
-        except requests.exceptions.RequestException as e:
-            # Handle request errors gracefully
-            # Provides detailed error information without crashing the application
-            error_message = f"Azure OpenAI API error: {str(e)}"
-            if self.verbose:
-                print(error_message)
-            return {
-                "response": f"Error: Failed to generate response from Azure OpenAI. {error_message}",
-                "source": "error",
-                "error": str(e),
-                "generation_time": time.time() - start_time
-            }
-    
-    def generate_with_context(self, prompt: str, context_docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return self._error_response(e, start_time)
+
+    def _error_response(self, e: Exception, start_time: float) -> Dict[str, Any]:
+        """Build the structured error response used by all request paths."""
+        # Handle request errors gracefully
+        # Provides detailed error information without crashing the application
+        error_message = f"Azure OpenAI API error: {str(e)}"
+        if self.verbose:
+            print(error_message)
+        return {
+            "response": f"Error: Failed to generate response from Azure OpenAI. {error_message}",
+            "source": "error",
+            "error": str(e),
+            "generation_time": time.time() - start_time
+        }
+
+    async def _enqueue(
+        self, prompt: str, system_prompt: Optional[str], messages: List[Dict[str, str]]
+    ) -> Dict[str, Any]:
         """
-        Generate a completion with document context using RAG (Retrieval-Augmented Generation) pattern.
-        
+        Hand a prompt to the batch worker and wait for its response.
+
+        Args:
+            prompt: User prompt
+            system_prompt: Optional system message (batches must share it)
+            messages: Pre-built chat messages, used for single-item fallback
+
+        Returns:
+            Response with generated text and metadata
+        """
+        if self._batch_queue is None:
+            self._batch_queue = asyncio.Queue()
+        if self._batch_task is None or self._batch_task.done():
+            self._batch_task = asyncio.get_running_loop().create_task(self._batch_worker())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._batch_queue.put((prompt, system_prompt, messages, future))
+        return await future
+
+    async def _batch_worker(self) -> None:
+        """
+        Background coroutine coalescing concurrent prompts into batched requests.
+
+        Waits for the first queued prompt, then drains further prompts for up
+        to batch_window seconds (or until max_batch items are buffered) and
+        dispatches them together. Under bursty load this cuts requests/min by
+        up to the batch factor, which matters when Azure RPM limits bind.
+        """
+        while True:
+            item = await self._batch_queue.get()
+            batch = [item]
+
+            # Drain more items until the window closes or the batch is full
+            deadline = asyncio.get_running_loop().time() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._batch_queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Group by system prompt: a batched completions call can only share
+            # one instruction preamble (sampling params are instance-level)
+            groups: Dict[Optional[str], List[tuple]] = {}
+            for entry in batch:
+                groups.setdefault(entry[1], []).append(entry)
+
+            for group in groups.values():
+                if len(group) == 1:
+                    # No batching opportunity - use the regular chat endpoint
+                    _, _, messages, future = group[0]
+                    task = asyncio.get_running_loop().create_task(self._post_chat(messages))
+                    task.add_done_callback(self._make_resolver([future]))
+                else:
+                    futures = [entry[3] for entry in group]
+                    task = asyncio.get_running_loop().create_task(
+                        self._post_completions_batch(
+                            [entry[0] for entry in group], group[0][1]
+                        )
+                    )
+                    task.add_done_callback(self._make_resolver(futures))
+
+    @staticmethod
+    def _make_resolver(futures: List[asyncio.Future]):
+        """Build a done-callback distributing a dispatch task's results."""
+        def resolver(task: asyncio.Task) -> None:
+            try:
+                results = task.result()
+            except Exception as e:  # Defensive: dispatch paths return error dicts
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            if isinstance(results, dict):
+                results = [results] * len(futures)
+            for future, result in zip(futures, results):
+                if not future.done():
+                    future.set_result(result)
+        return resolver
+
+    @staticmethod
+    def _chat_messages(prompt: str, system_prompt: Optional[str]) -> List[Dict[str, str]]:
+        """Assemble the OpenAI chat messages array for a single prompt."""
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+        return messages
+
+    async def _post_completions_batch(
+        self, prompts: List[str], system_prompt: Optional[str]
+    ) -> List[Dict[str, Any]]:
+        """
+        Issue one completions request carrying several prompts.
+
+        Azure's (non-chat) completions API accepts a prompt array and returns
+        one choice per prompt, so N concurrent queries cost a single request.
+        The shared system prompt is folded into each prompt text since the
+        completions API has no separate system message.
+
+        Args:
+            prompts: User prompts buffered within one batch window
+            system_prompt: System message shared by every prompt in the batch
+
+        Returns:
+            One response dict per prompt, in input order
+        """
+        start_time = time.time()
+
+
+        if system_prompt:
+            prompt_array = [f"{system_prompt}\n\n{p}" for p in prompts]
+        else:
+            prompt_array = list(prompts)
+
+        request_data = {
+            "prompt": prompt_array,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+        }
+
+        if self.verbose:
+            print(f"Dispatching batched Azure request with {len(prompts)} prompts")
+
+        try:
+            session = self._get_session()
+            async with session.post(
+                self._completions_url,
+                headers=self._headers,
+                # orjson is a C-speed encoder; the Content-Type header is
+                # already application/json so raw bytes are equivalent
+                data=orjson.dumps(request_data),
+                timeout=aiohttp.ClientTimeout(total=60),
+            ) as response:
+                response.raise_for_status()
+                response_data = await response.json()
+
+            generation_time = time.time() - start_time
+            usage = response_data.get("usage", {})
+
+            # Choices carry an "index" mapping each completion to its prompt
+            texts = ["No response generated."] * len(prompts)
+            for choice in response_data.get("choices", []):
+                idx = choice.get("index", 0)
+                if 0 <= idx < len(texts):
+                    texts[idx] = choice.get("text", "").strip()
+
+            # Usage is reported for the whole batch; expose it alongside the
+            # batch size so callers can attribute cost if they need to
+            return [
+                {
+                    "response": text,
+                    "source": "azure",
+                    "model": self.deployment_name,
+                    "generation_time": generation_time,
+                    "prompt_tokens": usage.get("prompt_tokens", 0),
+                    "completion_tokens": usage.get("completion_tokens", 0),
+                    "total_tokens": usage.get("total_tokens", 0),
+                    "batch_size": len(prompts),
+                }
+                for text in texts
+            ]
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Chat-only deployments (gpt-4o and friends) reject the legacy
+            # completions API outright; recover with per-prompt chat calls
+            # rather than failing every query in the batch
+            if getattr(e, "status", None) in (400, 404, 405):
+                if self.verbose:
+                    print(f"Batched completions rejected ({e.status}); "
+                          f"falling back to per-prompt chat requests")
+                return list(await asyncio.gather(*[
+                    self._post_chat(self._chat_messages(prompt, system_prompt))
+                    for prompt in prompts
+                ]))
+            return [self._error_response(e, start_time) for _ in prompts]
+
+
+    async def astream(self, prompt: str, system_prompt: Optional[str] = None):
+        """
+        Stream completion text chunks as they arrive from Azure OpenAI.
+
+        Uses the Server-Sent-Events protocol ("stream": true) so the first
+        token is available after roughly first-token latency instead of full
+        generation latency, and long completions never sit buffered in memory
+        twice. Yields plain text deltas; callers aggregate metadata themselves.
+
+        Args:
+            prompt: User prompt
+            system_prompt: Optional system message
+
+        Yields:
+            Generated text fragments in arrival order
+        """
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+
+        request_data = {
+            "messages": messages,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "stream": True,
+        }
+
+        if self.verbose:
+            print(f"Streaming from Azure OpenAI API for prompt: {prompt[:50]}...")
+
+        session = self._get_session()
+        async with session.post(
+            self._chat_url,
+            headers=self._headers,
+            data=orjson.dumps(request_data),
+            timeout=aiohttp.ClientTimeout(total=60),
+        ) as response:
+            response.raise_for_status()
+
+            # Azure sends "data: {json}" SSE frames terminated by "data: [DONE]"
+            async for raw_line in response.content:
+                line = raw_line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                chunk = json.loads(payload)
+                choices = chunk.get("choices") or []
+                if not choices:
+                    continue
+                content = choices[0].get("delta", {}).get("content")
+                if content:
+                    yield content
+
+    async def astream_with_context(self, prompt: str, context_docs: List[Dict[str, Any]]):
+        """
+        Stream a context-grounded completion (RAG variant of astream).
+
+        Args:
+            prompt: User query
+            context_docs: List of context documents from vector store
+
+        Yields:
+            Generated text fragments in arrival order
+        """
+        user_prompt, system_prompt = self._build_context_prompts(prompt, context_docs)
+        async for chunk in self.astream(user_prompt, system_prompt):
+            yield chunk
+
+    def _build_context_prompts(self, prompt: str, context_docs: List[Dict[str, Any]]) -> tuple:
+        """
+        Build the (user_prompt, system_prompt) pair for a RAG request.
+
         Design decisions:
         - Formats retrieved documents in a structured way for the model
         - Uses careful prompt engineering to ensure model uses provided context
-        - Implements a RAG pattern for knowledge-grounded responses
         - Instructs model to cite sources for accountability
-        
+
         Args:
             prompt: User query
             context_docs: List of context documents from vector store
-            
+
         Returns:
-            Response with generated text and metadata
+            Tuple of (user_prompt, system_prompt)
         """
+        # Sort documents by stable identity so identical retrieval sets always
+        # produce byte-identical context text (maximizes prefix-cache reuse)
+        ordered_docs = sorted(
+            context_docs,
+            key=lambda doc: (doc.get("source", "unknown"), doc.get("chunk_index", 0))
+        )
+
         # Format retrieved documents with source attribution
         # Numbered for easy reference in model responses
-        context_text = "\n\n".join([f"Document [{i+1}] (from {doc.get('source', 'unknown')}): {doc['text']}" 
-                                  for i, doc in enumerate(context_docs)])
-        
+        context_text = "\n\n".join([f"Document [{i+1}] (from {doc.get('source', 'unknown')}): {doc['text']}"
+                                  for i, doc in enumerate(ordered_docs)])
+
         # System prompt provides instruction on how to use context
-        # Constraints help ensure higher quality responses
-        system_prompt = """You are a helpful assistant. Answer the user's question based only on the provided context. 
+        # Constraints help ensure higher quality responses.
+        # Kept byte-identical across requests: Azure's server-side prompt
+        # cache only matches on a shared prefix, so no dynamic substitutions.
+        system_prompt = """You are a helpful assistant. Answer the user's question based only on the provided context.
 If the context doesn't contain the information needed to answer the question, say you don't know and don't make up information.
 Be concise but thorough, and cite which document you used by referring to its number."""
-        
-        # Format the user message with context
-        # Clear separation between context and query helps model understand the task
-        user_prompt = f"""I need information from the following context:
 
+        # Format the user message with static boilerplate first, then context,
+        # with the per-query question last - longest shared prefix leads, so
+        # repeat queries over the same documents re-hit the provider cache
+        user_prompt = f"""I need information from the following context. Based only on this context, answer the question at the end.
+
+CONTEXT:
 {context_text}
 
-Based on this context, please answer my question: {prompt}"""
+QUESTION: {prompt}"""
+
+        return user_prompt, system_prompt
+
+    def _semantic_cache_lookup(self, prompt: str, context_docs: List[Dict[str, Any]]):
+        """
+        Consult the semantic cache for a paraphrase hit against the same context.
+
+        The cache is approximate by design, so its gate covers the default
+        temperature; configurable for operators who want it stricter.
+
+        Returns:
+            Tuple of (cached response or None, doc_key, query embedding)
+        """
+        if (self.semantic_cache is None
+                or self.temperature > self.semantic_cache_max_temperature):
+            return None, None, None
+        doc_key = self.semantic_cache.doc_key(context_docs)
+        cached, query_vec = self.semantic_cache.lookup(prompt, doc_key)
+        if cached is not None and self.verbose:
+            print(f"Semantic cache hit for prompt: {prompt[:50]}...")
+        return cached, doc_key, query_vec
+
+    def generate_with_context(self, prompt: str, context_docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Generate a completion with document context using RAG (Retrieval-Augmented Generation) pattern.
+
+        Synchronous variant for non-async callers; the FastAPI handlers should
+        await agenerate_with_context() instead.
+
+        Args:
+            prompt: User query
+            context_docs: List of context documents from vector store
+
+        Returns:
+            Response with generated text and metadata
+        """
+        cached, doc_key, query_vec = self._semantic_cache_lookup(prompt, context_docs)
+        if cached is not None:
+            return cached
+
+        user_prompt, system_prompt = self._build_context_prompts(prompt, context_docs)
 
         # Use the standard generate method with our specialized prompts
-        return self.generate(user_prompt, system_prompt)
+        result = self.generate(user_prompt, system_prompt)
+
+        # Store the fresh response so future paraphrases of this query hit the cache
+        if query_vec is not None:
+            self.semantic_cache.add(query_vec, doc_key, result)
+
+        return result
+
+    async def agenerate_with_context(self, prompt: str, context_docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Async variant of generate_with_context for use inside the event loop.
+
+        Args:
+            prompt: User query
+            context_docs: List of context documents from vector store
+
+        Returns:
+            Response with generated text and metadata
+        """
+        cached, doc_key, query_vec = self._semantic_cache_lookup(prompt, context_docs)
+        if cached is not None:
+            return cached
+
+        user_prompt, system_prompt = self._build_context_prompts(prompt, context_docs)
+
+        result = await self.agenerate(user_prompt, system_prompt)
+
+        # Store the fresh response so future paraphrases of this query hit the cache
+        if query_vec is not None:
+            self.semantic_cache.add(query_vec, doc_key, result)
+
+        return result
@@ -0,0 +1,98 @@
+import os
+import orjson
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# CacheStore: disk persistence for the response caches.
+# In-process caches die on restart, so every redeploy re-pays Azure token cost
+# and local generation time for answers the app already produced. This backs
+# the exact-match and semantic caches with a small SQLite database in WAL
+# mode; entries are loaded once at startup and written append-only from a
+# background thread so request handlers never block on disk.
+class CacheStore:
+    def __init__(self, db_path: str):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            db_path: Path to the SQLite file, e.g. data/cache.db
+        """
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+
+        # autocommit (isolation_level=None) + WAL: readers never block the
+        # writer and each insert is a single cheap append to the log
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries("
+            "hash TEXT PRIMARY KEY, "
+            "kind TEXT NOT NULL, "      # Namespace: azure-exact / local-exact / semantic
+            "emb BLOB, "                # float32 query embedding (semantic entries only)
+            "resp TEXT NOT NULL, "      # JSON-encoded response payload
+            "ts REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_kind ON entries(kind)")
+
+        # One connection shared across threads: serialize access with a lock
+        self._conn_lock = threading.Lock()
+
+        # Background writer so cache inserts never block the request path
+        self._write_queue: queue.Queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_worker, daemon=True, name="cache-store-writer")
+        self._writer.start()
+
+    def load(self, kind: str) -> List[Tuple[str, Optional[bytes], Dict[str, Any]]]:
+        """
+        Load all persisted entries of one kind, oldest first.
+
+        Args:
+            kind: Entry namespace ("azure-exact", "local-exact", "semantic")
+
+        Returns:
+            List of (hash, embedding bytes or None, response payload) tuples
+        """
+        with self._conn_lock:
+            rows = self._conn.execute(
+                "SELECT hash, emb, resp FROM entries WHERE kind = ? ORDER BY ts", (kind,)
+            ).fetchall()
+        return [(key, emb, orjson.loads(resp)) for key, emb, resp in rows]
+
+    def put(self, kind: str, key: str, payload: Dict[str, Any], emb: Optional[bytes] = None) -> None:
+        """
+        Queue an entry for persistence; returns immediately.
+
+        Args:
+            kind: Entry namespace
+            key: Cache key (unique across kinds in practice)
+            payload: JSON-serializable response payload
+            emb: Optional float32 embedding bytes for semantic entries
+        """
+        self._write_queue.put((kind, key, orjson.dumps(payload).decode(), emb, time.time()))
+
+    def _write_worker(self) -> None:
+        """Drain queued inserts onto disk from a dedicated thread."""
+        while True:
+            item = self._write_queue.get()
+            if item is None:  # Shutdown sentinel
+                return
+            kind, key, resp, emb, ts = item
+            try:
+                with self._conn_lock:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO entries(hash, kind, emb, resp, ts) VALUES (?, ?, ?, ?, ?)",
+                        (key, kind, emb, resp, ts),
+                    )
+            except sqlite3.Error:
+                # Persistence is best-effort; the in-memory cache still works
+                pass
+
+    def close(self) -> None:
+        """Flush pending writes and close the database."""
+        self._write_queue.put(None)
+        self._writer.join(timeout=5)
+        with self._conn_lock:
+            self._conn.close()
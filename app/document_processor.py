@@ -1,19 +1,78 @@
 import os
+import bisect
+import re
+import threading
 from typing import List, Dict, Any
 from markitdown import MarkItDown  # Import markidown
 import hashlib
 
+# BLAKE3 is SIMD-accelerated and several times faster than the stdlib hashes
+# on chunk-sized inputs; fall back to blake2b when it isn't installed
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+
+def chunk_content_id(chunk: str) -> str:
+    """
+    Derive a stable, content-based ID for a text chunk.
+
+    Hashing the full chunk content (rather than file name + index) means the
+    same text produces the same ID wherever it appears, which lets the vector
+    store skip re-embedding duplicate chunks across files.
+
+    Args:
+        chunk: The chunk text
+
+    Returns:
+        32-char hex ID
+    """
+    data = chunk.encode()
+    if blake3 is not None:
+        return blake3.blake3(data).hexdigest()[:32]
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def process_pdf_worker(file_path: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Dict[str, Any]]:
+    """
+    Process a single PDF in a worker process.
+
+    Module-level so ProcessPoolExecutor children only need to import this
+    module (not app.main, which would pull in the LLM and vector-store
+    initialization). Each worker builds its own DocumentProcessor, giving it
+    a private MarkItDown instance - PDF parsing is CPU-bound and doesn't
+    reliably release the GIL, so processes are the right parallelism unit.
+
+    Args:
+        file_path: Path to the PDF file
+        chunk_size: The target size of each text chunk in characters
+        chunk_overlap: The overlap between chunks in characters
+
+    Returns:
+        List of dictionaries with text chunks and metadata
+    """
+    processor = DocumentProcessor(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return processor.process_pdf(file_path)
+
+
 class DocumentProcessor:
     def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
         """
         Initialize the document processor with chunk size and overlap parameters.
-        
+
         Args:
             chunk_size: The target size of each text chunk in characters
             chunk_overlap: The overlap between chunks in characters
         """
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+
+        # One MarkItDown instance reused across documents: constructing it per
+        # call re-initializes its converters each time, which adds up on bulk
+        # ingestion. MarkItDown isn't documented as thread-safe, so conversions
+        # are serialized with a lock.
+        self._md = MarkItDown()
+        self._md_lock = threading.Lock()
     
     def process_pdf(self, file_path: str) -> List[Dict[str, Any]]:
         """
@@ -30,10 +89,10 @@ class DocumentProcessor:
         
         file_name = os.path.basename(file_path)
         
-        # Convert PDF to Markdown using MarkItDown
+        # Convert PDF to Markdown using the shared MarkItDown instance
         try:
-            md = MarkItDown()  # Initialize MarkItDown
-            result = md.convert(file_path)  # Convert the PDF to Markdown
+            with self._md_lock:
+                result = self._md.convert(file_path)  # Convert the PDF to Markdown
             markdown_text = result.text_content  # Extract the Markdown content
         except Exception as e:
             raise RuntimeError(f"Failed to convert PDF to Markdown: {e}")
@@ -43,10 +102,15 @@ class DocumentProcessor:
         
         # Add metadata to chunks
         result = []
+        seen = set()  # Drop exact-duplicate chunks within this document
         for i, chunk in enumerate(chunks):
-            # Create a unique ID for each chunk based on content
-            chunk_id = hashlib.md5(f"{file_name}_{i}_{chunk[:50]}".encode()).hexdigest()
-            
+            # Content-based ID: identical text hashes to the same ID, enabling
+            # dedup both here and across files in the vector store
+            chunk_id = chunk_content_id(chunk)
+            if chunk_id in seen:
+                continue
+            seen.add(chunk_id)
+
             result.append({
                 "id": chunk_id,
                 "text": chunk,
@@ -70,28 +134,44 @@ class DocumentProcessor:
         chunks = []
         start = 0
         text_length = len(text)
-        
+
+        # Precompute every candidate break position in one forward pass per
+        # separator. Each chunk boundary then becomes an O(log N) bisect
+        # instead of up to three O(chunk_size) backward rfind scans that
+        # repeat the same work for overlapping windows - O(N) total.
+        # Positions record the end of the separator, matching the old
+        # `last_separator + len(separator)` correction. The lookahead pattern
+        # yields overlapping matches (e.g. both "\n\n" starts inside "\n\n\n"),
+        # which plain finditer would skip but rfind could land on.
+        break_positions = [
+            (len(separator),
+             [m.start() + len(separator)
+              for m in re.finditer(f"(?={re.escape(separator)})", text)])
+            for separator in ["\n\n", ".", " "]
+        ]
+
         while start < text_length:
             # Find the end of the chunk
             end = min(start + self.chunk_size, text_length)
-            
+
             # If we're not at the end of the text, try to find a good breaking point
             if end < text_length:
                 # Look for paragraph breaks, periods, or spaces to break at
-                for separator in ["\n\n", ".", " "]:
-                    last_separator = text.rfind(separator, start, end)
-                    if last_separator != -1:
-                        end = last_separator + len(separator)
+                for sep_len, positions in break_positions:
+                    # Rightmost separator ending at or before the chunk limit
+                    idx = bisect.bisect_right(positions, end) - 1
+                    if idx >= 0 and positions[idx] - sep_len >= start:
+                        end = positions[idx]
                         break
-            
+
             # Add chunk to the list
             chunks.append(text[start:end].strip())
-            
+
             # Move to the next chunk with overlap
             start = max(start, end - self.chunk_overlap)
-            
+
             # If we couldn't move forward, force move to avoid infinite loop
             if start == end - self.chunk_overlap:
                 start = end
-        
+
         return chunks
@@ -1,39 +1,343 @@
 import os
+import copy
+import hashlib
+import inspect
+import json
+import queue
+import re
+import shutil
+import struct
+import subprocess
+import threading
+import collections
 from typing import Dict, Any, Optional, List
+import llama_cpp
 from llama_cpp import Llama
 import time
 
+
+# Fixed-width GGUF metadata value types, keyed by the spec's type codes
+# (8 = string and 9 = array are variable-width and handled separately)
+_GGUF_TYPE_FMT = {
+    0: "B", 1: "b", 2: "H", 3: "h", 4: "I", 5: "i",
+    6: "f", 7: "?", 10: "Q", 11: "q", 12: "d",
+}
+
+# llama.cpp LLAMA_FTYPE values that mean "not yet quantized"
+# (ALL_F32 = 0, MOSTLY_F16 = 1, MOSTLY_BF16 = 32)
+_GGUF_UNQUANTIZED_FTYPES = {0, 1, 32}
+
+# Quantization tag in a GGUF filename, e.g. model.Q4_K_M.gguf or
+# phi-2.q8_0.gguf - the fallback signal when the header can't be read
+_FILENAME_QUANT_RE = re.compile(r"(?:^|[._-])i?q\d+(?:_[a-z0-9]+)*", re.IGNORECASE)
+
+
+def _gguf_file_type(model_path: str):
+    """
+    Read general.file_type from a GGUF header, or None when unreadable.
+
+    Walks the metadata KV section of the header (a few KB of sequential
+    reads, no tensor data touched) until the key is found. Any parse
+    problem - pre-v2 files, truncation, unknown value types - returns None
+    so callers fall back to weaker signals instead of failing.
+    """
+    try:
+        with open(model_path, "rb") as f:
+            if f.read(4) != b"GGUF":
+                return None
+            version, _n_tensors, n_kv = struct.unpack("<IQQ", f.read(20))
+            if version < 2:
+                # v1 used 32-bit lengths everywhere; too old to matter
+                return None
+
+            def read_string() -> bytes:
+                (length,) = struct.unpack("<Q", f.read(8))
+                return f.read(length)
+
+            def skip_value(vtype: int) -> None:
+                if vtype == 8:
+                    read_string()
+                elif vtype == 9:
+                    elem_type, count = struct.unpack("<IQ", f.read(12))
+                    for _ in range(count):
+                        skip_value(elem_type)
+                else:
+                    f.seek(struct.calcsize("<" + _GGUF_TYPE_FMT[vtype]), 1)
+
+            for _ in range(n_kv):
+                key = read_string()
+                (vtype,) = struct.unpack("<I", f.read(4))
+                if key == b"general.file_type" and vtype in _GGUF_TYPE_FMT:
+                    fmt = "<" + _GGUF_TYPE_FMT[vtype]
+                    return int(struct.unpack(fmt, f.read(struct.calcsize(fmt)))[0])
+                skip_value(vtype)
+    except (OSError, KeyError, struct.error):
+        return None
+    return None
+
+
+def ensure_quantized(model_path: str, target_quant: str, verbose: bool = False) -> str:
+    """
+    Return a path to a quantized build of the model, producing one if needed.
+
+    If a sibling file quantized to target_quant already exists it is used
+    directly. A model that is itself already quantized (per the GGUF
+    general.file_type header, or a quant tag in the filename when the header
+    is unreadable) is returned as-is: re-quantizing a lossy format is
+    strictly worse than the source. Otherwise, when a llama.cpp quantize
+    binary is on PATH, the quantized file is produced once and reused on
+    later runs. Falls back to the original path when none of this is
+    possible, so this never blocks startup.
+
+    Args:
+        model_path: Path to the source GGUF model file
+        target_quant: Quantization type name, e.g. "Q4_K_M"
+        verbose: Whether to print progress output
+
+    Returns:
+        Path to the model file to load
+    """
+    base, ext = os.path.splitext(model_path)
+    quant_path = f"{base}.{target_quant}{ext}"
+    if os.path.exists(quant_path):
+        return quant_path
+
+    # Most downloaded GGUFs ship pre-quantized (just not named to match);
+    # never run a lossy second pass over one of those
+    file_type = _gguf_file_type(model_path)
+    if file_type is not None:
+        if file_type not in _GGUF_UNQUANTIZED_FTYPES:
+            if verbose:
+                print(f"Model {os.path.basename(model_path)} is already "
+                      f"quantized (file_type {file_type}), skipping quantization")
+            return model_path
+    elif _FILENAME_QUANT_RE.search(os.path.basename(model_path)):
+        return model_path
+
+    # Prefer the unambiguous binary name (llama.cpp renamed it in 2024);
+    # plain "quantize" is kept for older installs
+    binary = shutil.which("llama-quantize") or shutil.which("quantize")
+    if binary is None:
+        return model_path
+
+    if verbose:
+        print(f"Quantizing {model_path} to {target_quant}...")
+    try:
+        subprocess.run(
+            [binary, model_path, quant_path, target_quant],
+            check=True, capture_output=True
+        )
+    except (subprocess.CalledProcessError, OSError):
+        # Keep the original model if quantization fails for any reason
+        if os.path.exists(quant_path):
+            os.remove(quant_path)
+        return model_path
+
+    return quant_path
+
 class LocalLLM:
     def __init__(
-        self, 
-        model_path: str, 
+        self,
+        model_path: str,
         context_size: int = 2048,
         max_tokens: int = 512,
         temperature: float = 0.7,
+        cache_size: int = 256,
+        exact_cache_max_temperature: float = 0.0,
+        semantic_cache_max_temperature: float = 1.0,
+        n_parallel: int = 4,
+        batch_window: float = 0.010,
+        quantization: Optional[str] = None,
+        cache_store=None,
         verbose: bool = False
     ):
         """
         Initialize the local LLM using llama.cpp.
-        
+
         Args:
             model_path: Path to the GGUF model file
             context_size: Maximum context size for the model
             max_tokens: Maximum tokens to generate
             temperature: Sampling temperature
+            cache_size: Maximum number of responses held in the exact-match cache
+            exact_cache_max_temperature: Highest temperature at which the
+                         exact-match cache is consulted and filled (0.0 =
+                         deterministic output only)
+            semantic_cache_max_temperature: Highest temperature at which the
+                         semantic (paraphrase) cache is consulted and filled
+            n_parallel: Maximum prompts drained per generation batch
+            batch_window: How long to buffer concurrent prompts before dispatch
+            quantization: Preferred GGUF quantization (e.g. "Q4_K_M"); a
+                          quantized sibling file is picked up or produced
+                          via llama.cpp's quantize binary when available
+            cache_store: Optional app.cache_store.CacheStore; when given, the
+                         exact-match cache survives restarts
             verbose: Whether to print verbose output
         """
+        # Initialize model
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Model not found: {model_path}")
+
+        # Prefer a quantized build: decoding is memory-bandwidth bound, so
+        # fewer bytes/weight translate almost directly into tokens/sec
+        if quantization:
+            model_path = ensure_quantized(model_path, quantization, verbose=verbose)
+
         self.model_path = model_path
         self.max_tokens = max_tokens
         self.temperature = temperature
         self.verbose = verbose
         self.context_size = context_size
-        
-        # Initialize model
-        if not os.path.exists(model_path):
-            raise FileNotFoundError(f"Model not found: {model_path}")
-        
+
         # Lazy loading - we'll load the model when it's first used
         self.model = None
+
+        # Exact-match response cache (LRU), mirroring AzureLLM.
+        # A hit skips the whole llama.cpp generation pass; only consulted at
+        # or below exact_cache_max_temperature (default 0, i.e. only when
+        # repeat prompts are actually deterministic).
+        self.cache_size = cache_size
+        self.exact_cache_max_temperature = exact_cache_max_temperature
+        self.semantic_cache_max_temperature = semantic_cache_max_temperature
+        self._cache = collections.OrderedDict()
+        self._cache_lock = threading.Lock()
+
+        # Optional disk persistence: reload previous responses at startup so
+        # a restart doesn't re-pay generation time for known answers
+        self._cache_store = cache_store
+        if cache_store is not None:
+            for key, _, resp in cache_store.load("local-exact")[-cache_size:]:
+                self._cache[key] = resp
+
+        # Optional semantic (embedding-similarity) cache, shared with AzureLLM.
+        # Injected by the application (see app/main.py).
+        self.semantic_cache = None
+
+        # Generation queue: llama.cpp contexts are not safe for concurrent
+        # calls, so concurrent generate() callers hand their prompts to a
+        # single worker thread. The worker drains up to n_parallel queued
+        # prompts per wake-up (mirroring the AzureLLM batcher) and runs them
+        # back-to-back while the model stays hot, instead of letting request
+        # threads fight over a lock in arbitrary order.
+        self.n_parallel = n_parallel
+        self.batch_window = batch_window
+        self._gen_queue: queue.Queue = queue.Queue()
+        self._gen_thread = None
+        self._gen_thread_lock = threading.Lock()
+
+        # The queue only serializes generate() callers; stream() runs on the
+        # StreamingResponse worker thread and warm_up() on the startup
+        # executor, so every create_completion call must additionally hold
+        # this lock - the llama.cpp context cannot survive two threads at once
+        self._model_lock = threading.Lock()
+
+    def _ensure_worker(self):
+        """Start the generation worker thread on first use."""
+        with self._gen_thread_lock:
+            if self._gen_thread is None or not self._gen_thread.is_alive():
+                self._gen_thread = threading.Thread(
+                    target=self._gen_worker, daemon=True, name="local-llm-gen"
+                )
+                self._gen_thread.start()
+
+    def _gen_worker(self):
+        """
+        Drain queued prompts in small batches and generate sequentially.
+
+        llama-cpp-python's high-level API decodes one prompt at a time, so the
+        coalesced batch is processed back-to-back on this thread; the queue
+        still bounds latency jitter and keeps model access single-threaded.
+        """
+        while True:
+            batch = [self._gen_queue.get()]
+
+            # Gather more concurrent prompts until the window closes or the
+            # batch is full
+            deadline = time.time() + self.batch_window
+            while len(batch) < self.n_parallel:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._gen_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            if self.verbose and len(batch) > 1:
+                print(f"Processing batch of {len(batch)} local prompts")
+
+            for full_prompt, holder in batch:
+                try:
+                    holder["result"] = self._generate_one(full_prompt)
+                except Exception as e:
+                    holder["error"] = e
+                holder["done"].set()
+
+    def _generate_one(self, full_prompt: str) -> Dict[str, Any]:
+        """
+        Run a single completion on the worker thread.
+
+        Args:
+            full_prompt: The fully formatted prompt
+
+        Returns:
+            Response containing generated text and metadata
+        """
+        start_time = time.time()
+
+        # Generate completion
+        with self._model_lock:
+            response = self.model.create_completion(
+                prompt=full_prompt,
+                max_tokens=self.max_tokens,
+                temperature=self.temperature,
+                stop=["<|user|>", "<|system|>"]  # Stop tokens
+            )
+
+        generation_time = time.time() - start_time
+
+        # Extract the generated text
+        generated_text = response.get("choices", [{}])[0].get("text", "").strip()
+
+        return {
+            "response": generated_text,
+            "source": "local",
+            "model": os.path.basename(self.model_path),
+            "generation_time": generation_time,
+            "completion_tokens": len(response.get("choices", [{}])[0].get("text", "").split())
+        }
+
+    def _cache_key(self, full_prompt: str) -> str:
+        """Build a stable cache key from the full prompt and sampling parameters."""
+        payload = {
+            "prompt": full_prompt,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "model": self.model_path,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def _cache_get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a cached response copy for the key, or None on miss."""
+        with self._cache_lock:
+            if key not in self._cache:
+                return None
+            self._cache.move_to_end(key)
+            cached = copy.deepcopy(self._cache[key])
+        cached["source"] = "local-cache"
+        cached["generation_time"] = 0
+        return cached
+
+    def _cache_put(self, key: str, response: Dict[str, Any]) -> None:
+        """Store a response under the key, evicting the LRU entry when full."""
+        with self._cache_lock:
+            self._cache[key] = copy.deepcopy(response)
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        # Persist asynchronously; a background thread does the actual write
+        if self._cache_store is not None:
+            self._cache_store.put("local-exact", key, response)
     
     def _load_model(self):
         """Load the model if not already loaded"""
@@ -41,13 +345,48 @@ class LocalLLM:
             if self.verbose:
                 print(f"Loading model from {self.model_path}...")
             start_time = time.time()
+
+            # Loader flags that newer llama-cpp-python builds support; probed
+            # via the constructor signature so older pins keep working.
+            # KV-cache quantization (Q8_0 keys/values) halves the per-token
+            # KV bandwidth, which is the other big memory stream in decode.
+            extra_kwargs = {}
+            llama_params = inspect.signature(Llama.__init__).parameters
+            if "offload_kqv" in llama_params:
+                extra_kwargs["offload_kqv"] = True
+            if "flash_attn" in llama_params:
+                extra_kwargs["flash_attn"] = True
+            if "type_k" in llama_params and "type_v" in llama_params:
+                q8_0 = getattr(llama_cpp, "GGML_TYPE_Q8_0", None)
+                if q8_0 is not None:
+                    extra_kwargs["type_k"] = q8_0
+                    extra_kwargs["type_v"] = q8_0
+
             self.model = Llama(
                 model_path=self.model_path,
                 n_ctx=self.context_size,
-                n_gpu_layers=-1  # Auto-detect number of layers to offload to GPU
+                n_gpu_layers=-1,  # Auto-detect number of layers to offload to GPU
+                n_threads=max(1, (os.cpu_count() or 2) // 2),  # Physical-core count on typical SMT boxes
+                n_batch=512,      # Larger prompt-eval batches for better throughput
+                use_mmap=True,    # Map weights so warm-up faults pages in once
+                **extra_kwargs
             )
             if self.verbose:
                 print(f"Model loaded in {time.time() - start_time:.2f}s")
+
+    def warm_up(self):
+        """
+        Load the model and run a single-token generation.
+
+        Called from the FastAPI startup hook so the multi-second model load
+        (and first-pass initialization of compute kernels / mmap page faults)
+        happens once at boot instead of on the first user request.
+        """
+        self._load_model()
+        with self._model_lock:
+            self.model.create_completion(prompt=" ", max_tokens=1)
+        if self.verbose:
+            print("Local model warmed up")
     
     def generate(self, prompt: str, system_prompt: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -61,59 +400,128 @@ class LocalLLM:
             Response containing generated text and metadata
         """
         self._load_model()
-        
-        start_time = time.time()
-        
+
         # Combine system prompt and user prompt if needed
         if system_prompt:
             full_prompt = f"<|system|>\n{system_prompt}\n<|user|>\n{prompt}\n<|assistant|>"
         else:
             full_prompt = prompt
-            
+
+        # Short-circuit on an exact-match cache hit when the configured gate
+        # considers output at this temperature repeatable
+        cache_key = self._cache_key(full_prompt)
+        if self.temperature <= self.exact_cache_max_temperature:
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                if self.verbose:
+                    print(f"Cache hit for prompt: {prompt[:50]}...")
+                return cached
+
         if self.verbose:
             print(f"Generating response with local LLM for prompt: {prompt[:50]}...")
-            
-        # Generate completion
-        response = self.model.create_completion(
-            prompt=full_prompt,
-            max_tokens=self.max_tokens,
-            temperature=self.temperature,
-            stop=["<|user|>", "<|system|>"]  # Stop tokens
-        )
-        
-        generation_time = time.time() - start_time
-        
-        # Extract the generated text
-        generated_text = response.get("choices", [{}])[0].get("text", "").strip()
-        
-        return {
-            "response": generated_text,
-            "source": "local",
-            "model": os.path.basename(self.model_path),
-            "generation_time": generation_time,
-            "completion_tokens": len(response.get("choices", [{}])[0].get("text", "").split())
-        }
-    
-    def generate_with_context(self, prompt: str, context_docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+
+        # Hand the prompt to the generation worker and wait for the result;
+        # this serializes model access and coalesces concurrent callers
+        self._ensure_worker()
+        holder = {"done": threading.Event()}
+        self._gen_queue.put((full_prompt, holder))
+        holder["done"].wait()
+        if "error" in holder:
+            raise holder["error"]
+        result = holder["result"]
+
+        # Cache the response for future exact repeats when gated on
+        if self.temperature <= self.exact_cache_max_temperature:
+            self._cache_put(cache_key, result)
+
+        return result
+
+    def stream(self, prompt: str, system_prompt: Optional[str] = None):
         """
-        Generate a completion with document context.
-        
+        Stream completion text chunks as llama.cpp generates them.
+
+        Yields each token fragment as soon as it is decoded, so callers can
+        forward output with first-token latency instead of waiting for the
+        full completion. Yields plain text; callers aggregate metadata.
+
+        Args:
+            prompt: The user prompt
+            system_prompt: Optional system prompt
+
+        Yields:
+            Generated text fragments in decode order
+        """
+        self._load_model()
+
+        # Combine system prompt and user prompt if needed
+        if system_prompt:
+            full_prompt = f"<|system|>\n{system_prompt}\n<|user|>\n{prompt}\n<|assistant|>"
+        else:
+            full_prompt = prompt
+
+        if self.verbose:
+            print(f"Streaming response with local LLM for prompt: {prompt[:50]}...")
+
+        # Hold the model lock for the whole decode: a concurrent generate()
+        # runs on the worker thread against the same llama.cpp context, and
+        # interleaving the two corrupts it. Queued work resumes at stream end.
+        with self._model_lock:
+            for chunk in self.model.create_completion(
+                prompt=full_prompt,
+                max_tokens=self.max_tokens,
+                temperature=self.temperature,
+                stop=["<|user|>", "<|system|>"],  # Stop tokens
+                stream=True
+            ):
+                text = chunk.get("choices", [{}])[0].get("text", "")
+                if text:
+                    yield text
+
+    def stream_with_context(self, prompt: str, context_docs: List[Dict[str, Any]]):
+        """
+        Stream a context-grounded completion (RAG variant of stream).
+
         Args:
             prompt: The user query
             context_docs: List of context documents from vector store
-            
+
+        Yields:
+            Generated text fragments in decode order
+        """
+        full_prompt, system_prompt = self._build_context_prompts(prompt, context_docs)
+        yield from self.stream(full_prompt, system_prompt)
+
+    def _build_context_prompts(self, prompt: str, context_docs: List[Dict[str, Any]]) -> tuple:
+        """
+        Build the (full_prompt, system_prompt) pair for a context-grounded request.
+
+        Args:
+            prompt: The user query
+            context_docs: List of context documents from vector store
+
         Returns:
-            Response with generated text and metadata
+            Tuple of (full_prompt, system_prompt)
         """
+        # Sort documents by stable identity so identical retrieval sets always
+        # produce byte-identical prompts - llama.cpp's KV prefix cache can
+        # then reuse the already-computed context tokens
+        ordered_docs = sorted(
+            context_docs,
+            key=lambda doc: (doc.get("source", "unknown"), doc.get("chunk_index", 0))
+        )
+
         # Format the context documents
-        context_text = "\n\n".join([f"Document [{i+1}] (from {doc.get('source', 'unknown')}): {doc['text']}" 
-                                  for i, doc in enumerate(context_docs)])
-        
-        # Create the context-aware prompt
-        system_prompt = """You are a helpful assistant. Answer the user's question based on the provided context. 
+        context_text = "\n\n".join([f"Document [{i+1}] (from {doc.get('source', 'unknown')}): {doc['text']}"
+                                  for i, doc in enumerate(ordered_docs)])
+
+        # Create the context-aware prompt (static instructions kept
+        # byte-identical across requests for prefix reuse)
+        system_prompt = """You are a helpful assistant. Answer the user's question based on the provided context.
 If the context doesn't contain the information needed, say you don't know and avoid making up information.
 Use the provided documents to give accurate answers."""
-        
+
+        # Static boilerplate first, per-query question last: the shared
+        # prefix (instructions + context) stays identical across rephrasings
         full_prompt = f"""Context information:
 {context_text}
 
@@ -121,4 +529,39 @@ Question: {prompt}
 
 Answer:"""
 
-        return self.generate(full_prompt, system_prompt)
+        return full_prompt, system_prompt
+
+    def generate_with_context(self, prompt: str, context_docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Generate a completion with document context.
+        
+        Args:
+            prompt: The user query
+            context_docs: List of context documents from vector store
+            
+        Returns:
+            Response with generated text and metadata
+        """
+        # Consult the semantic cache first: a paraphrase of an earlier query
+        # against the same context documents can skip generation entirely.
+        # The cache is approximate by design, so its gate covers the default
+        # temperature; configurable for operators who want it stricter.
+        doc_key = query_vec = None
+        if (self.semantic_cache is not None
+                and self.temperature <= self.semantic_cache_max_temperature):
+            doc_key = self.semantic_cache.doc_key(context_docs)
+            cached, query_vec = self.semantic_cache.lookup(prompt, doc_key)
+            if cached is not None:
+                if self.verbose:
+                    print(f"Semantic cache hit for prompt: {prompt[:50]}...")
+                return cached
+
+        full_prompt, system_prompt = self._build_context_prompts(prompt, context_docs)
+
+        result = self.generate(full_prompt, system_prompt)
+
+        # Store the fresh response so future paraphrases of this query hit the cache
+        if query_vec is not None:
+            self.semantic_cache.add(query_vec, doc_key, result)
+
+        return result
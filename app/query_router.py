@@ -1,14 +1,33 @@
 from typing import Dict, Any, List, Tuple
 import re
 
+# Aho-Corasick gives a single C-level scan over all keywords at once;
+# fall back to plain Python substring loops when it isn't installed
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
 class QueryRouter:
-    def __init__(self, 
+    # Words that signal multi-clause reasoning; matched as whole words
+    LOGICAL_OPERATORS = ["and", "or", "not", "if", "then", "because", "therefore", "thus", "hence"]
+
+    # Phrases that are conversational filler rather than document questions;
+    # these don't benefit from retrieval at all
+    SMALL_TALK = {
+        "hi", "hello", "hey", "yo", "thanks", "thank you", "ok", "okay",
+        "bye", "goodbye", "good morning", "good afternoon", "good evening",
+        "how are you", "whats up", "what's up", "help", "test"
+    }
+    GREETING_STARTERS = {"hi", "hello", "hey", "thanks", "bye", "goodbye"}
+
+    def __init__(self,
                  word_limit: int = 20,
                  complexity_keywords: List[str] = None,
                  verbose: bool = False):
         """
         Initialize the query router.
-        
+
         Args:
             word_limit: Maximum number of words for a query to be considered simple
             complexity_keywords: List of keywords that indicate complex queries
@@ -16,15 +35,38 @@ class QueryRouter:
         """
         self.word_limit = word_limit
         self.verbose = verbose
-        
+
         # Default complexity keywords if none provided
         self.complexity_keywords = complexity_keywords or [
-            "compare", "contrast", "relate", "analyze", "evaluate", 
+            "compare", "contrast", "relate", "analyze", "evaluate",
             "synthesize", "elaborate", "explain why", "versus",
-            "difference between", "similarities", "hypothesis", 
+            "difference between", "similarities", "hypothesis",
             "implications", "consequences", "versus", "pros and cons",
             "advantages and disadvantages", "complex", "complicated"
         ]
+
+        # Precompiled comparative-statement pattern (compiled once, not per query)
+        self._comp_re = re.compile(r'\b(more|less|better|worse|larger|smaller|higher|lower)\b.*\b(than)\b')
+
+        # Precomputed for the fallback scan: padding each operator once here
+        # avoids two string allocations per operator on every call, and the
+        # keywords are lowercased once instead of per query
+        self._padded_logical = tuple(f" {op} " for op in self.LOGICAL_OPERATORS)
+        self._lower_keywords = tuple(k.lower() for k in self.complexity_keywords)
+
+        # Build one automaton matching every operator and keyword in a single
+        # O(|query|) pass, replacing ~30 Python-level substring searches.
+        # Logical operators are stored space-padded so they only match as
+        # whole words once the query itself is padded with spaces.
+        self._ac = None
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for op in self.LOGICAL_OPERATORS:
+                automaton.add_word(f" {op} ", ("logical operator", op))
+            for keyword in self.complexity_keywords:
+                automaton.add_word(keyword.lower(), ("complexity keyword", keyword))
+            automaton.make_automaton()
+            self._ac = automaton
     
     def is_simple_query(self, query: str) -> Tuple[bool, str]:
         """
@@ -44,28 +86,62 @@ class QueryRouter:
         if len(words) > self.word_limit:
             return False, f"Query exceeds {self.word_limit} words"
         
-        # Check for logical operators
-        logical_operators = ["and", "or", "not", "if", "then", "because", "therefore", "thus", "hence"]
-        for op in logical_operators:
-            if f" {op} " in f" {query} ":  # Add spaces to ensure we match whole words
-                return False, f"Contains logical operator: {op}"
-        
-        # Check for complexity keywords
-        for keyword in self.complexity_keywords:
-            if keyword.lower() in query:
-                return False, f"Contains complexity keyword: {keyword}"
-        
+        # Check for logical operators and complexity keywords.
+        # Padding the query with spaces lets the space-padded operator
+        # entries match whole words only, for both scan strategies.
+        padded = f" {query} "
+        if self._ac is not None:
+            # Single automaton pass covers every operator and keyword at once
+            for _, (category, match) in self._ac.iter(padded):
+                return False, f"Contains {category}: {match}"
+        else:
+            for op, padded_op in zip(self.LOGICAL_OPERATORS, self._padded_logical):
+                if padded_op in padded:
+                    return False, f"Contains logical operator: {op}"
+
+            for keyword, lowered in zip(self.complexity_keywords, self._lower_keywords):
+                if lowered in query:
+                    return False, f"Contains complexity keyword: {keyword}"
+
         # Check for question complexity (multiple question marks or nested questions)
         if query.count("?") > 1:
             return False, "Contains multiple questions"
-        
+
         # Check for comparative statements
-        comparative_pattern = r'\b(more|less|better|worse|larger|smaller|higher|lower)\b.*\b(than)\b'
-        if re.search(comparative_pattern, query):
+        if self._comp_re.search(query):
             return False, "Contains comparative statement"
-        
+
         return True, "Simple query"
     
+    def needs_context(self, query: str) -> bool:
+        """
+        Decide whether a query is worth a vector-store lookup at all.
+
+        Pure string checks, so callers can run this before paying for the
+        query-embedding forward pass - the dominant cost for short queries.
+
+        Args:
+            query: The user query
+
+        Returns:
+            False for greetings/small talk that retrieval can't improve
+        """
+        # Strip punctuation so "Hello!" and "thanks :)" normalize cleanly
+        normalized = re.sub(r"[^\w\s']", "", query.strip().lower()).strip()
+        if not normalized:
+            return False
+
+        if normalized in self.SMALL_TALK:
+            return False
+
+        # Very short messages opening with a greeting ("hey there") are
+        # conversational, not document questions
+        words = normalized.split()
+        if len(words) <= 3 and words[0] in self.GREETING_STARTERS:
+            return False
+
+        return True
+
     def route_query(self, query: str, context_docs: List[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Determine the routing decision for a query.
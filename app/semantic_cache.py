@@ -0,0 +1,177 @@
+import copy
+import hashlib
+import threading
+from typing import Dict, Any, Callable, List, Optional, Tuple, FrozenSet
+
+import numpy as np
+
+# SemanticCache: embedding-similarity response cache shared by the LLM backends.
+# Exact-match caching (see AzureLLM/LocalLLM) misses when the user rephrases a
+# question ("capital of France" vs "France's capital"). This cache embeds the
+# query, compares it against previously answered queries with a single matrix-
+# vector product, and returns the stored response when cosine similarity
+# exceeds a threshold and the retrieval context is identical.
+class SemanticCache:
+    def __init__(
+        self,
+        embed_fn: Callable[[str], np.ndarray],
+        similarity_threshold: float = 0.92,
+        max_entries: int = 512,
+        initial_capacity: int = 64,
+        store=None,
+    ):
+        """
+        Initialize the semantic cache.
+
+        Args:
+            embed_fn: Function mapping text to an embedding vector
+                      (reuse the model already loaded by VectorStore)
+            similarity_threshold: Minimum cosine similarity for a hit
+            max_entries: Maximum number of cached responses
+            initial_capacity: Initial number of rows in the embedding matrix
+            store: Optional app.cache_store.CacheStore; when given, cached
+                   entries are persisted and reloaded across restarts
+        """
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self._store = store
+
+        # Embeddings live in a pre-allocated growable float32 matrix so lookups
+        # are a single BLAS gemv (E @ q) instead of a Python loop. Rows are
+        # L2-normalized on insert, making the dot product a cosine similarity.
+        self._embeddings: Optional[np.ndarray] = None  # Allocated on first add
+        self._capacity = initial_capacity
+        self._count = 0
+        self._responses: List[Dict[str, Any]] = []
+        self._doc_keys: List[FrozenSet] = []
+        self._lock = threading.Lock()
+
+        # Rebuild the cache from disk: embeddings come back from their raw
+        # float32 bytes, doc keys from the persisted (source, chunk) pairs
+        if store is not None:
+            for _, emb, payload in store.load("semantic"):
+                if emb is None or "response" not in payload:
+                    continue
+                vec = np.frombuffer(emb, dtype=np.float32)
+                doc_key = frozenset(tuple(pair) for pair in payload.get("doc_key", []))
+                self.add(vec, doc_key, payload["response"], persist=False)
+
+    @staticmethod
+    def doc_key(context_docs: List[Dict[str, Any]]) -> FrozenSet:
+        """
+        Build a hashable identity for a set of retrieved context documents.
+
+        Args:
+            context_docs: Documents as returned by VectorStore.similarity_search
+
+        Returns:
+            Frozenset of (source, chunk_index) pairs
+        """
+        return frozenset(
+            (doc.get("source", "unknown"), doc.get("chunk_index", 0))
+            for doc in context_docs
+        )
+
+    def _normalize(self, embedding: np.ndarray) -> np.ndarray:
+        """Return the embedding as a flat, L2-normalized float32 vector."""
+        vec = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec = vec / norm
+        return vec
+
+    def lookup(
+        self, prompt: str, doc_key: FrozenSet
+    ) -> Tuple[Optional[Dict[str, Any]], np.ndarray]:
+        """
+        Look up a cached response for a semantically similar prompt.
+
+        Args:
+            prompt: The user query
+            doc_key: Identity of the retrieval context (see doc_key())
+
+        Returns:
+            Tuple of (cached response or None, normalized query embedding).
+            The embedding is returned so a subsequent add() can reuse it
+            without a second encoder forward pass.
+        """
+        query_vec = self._normalize(self.embed_fn(prompt))
+
+        with self._lock:
+            if self._count == 0:
+                return None, query_vec
+
+            # Single gemv over all cached embeddings; argmax picks best match
+            sims = self._embeddings[: self._count] @ query_vec
+            best = int(np.argmax(sims))
+            if sims[best] < self.similarity_threshold:
+                return None, query_vec
+
+            # Only reuse a response generated against the same context docs
+            if self._doc_keys[best] != doc_key:
+                return None, query_vec
+
+            cached = copy.deepcopy(self._responses[best])
+
+        cached["source"] = "semantic-cache"
+        cached["generation_time"] = 0
+        return cached, query_vec
+
+    def add(
+        self,
+        query_vec: np.ndarray,
+        doc_key: FrozenSet,
+        response: Dict[str, Any],
+        persist: bool = True,
+    ) -> None:
+        """
+        Store a generated response under its query embedding.
+
+        Args:
+            query_vec: Normalized query embedding (from lookup())
+            doc_key: Identity of the retrieval context
+            response: The generated response dict to cache
+            persist: Whether to write the entry to the backing store
+                     (False while reloading persisted entries at startup)
+        """
+        # Don't cache error responses - they aren't worth replaying
+        if response.get("source") == "error":
+            return
+
+        with self._lock:
+            if self._embeddings is None:
+                self._embeddings = np.zeros(
+                    (self._capacity, query_vec.shape[0]), dtype=np.float32
+                )
+
+            if self._count >= self.max_entries:
+                # Simple FIFO eviction: drop the oldest entry and shift.
+                # max_entries is small, so the memmove cost is negligible.
+                self._embeddings[:-1] = self._embeddings[1:]
+                self._responses.pop(0)
+                self._doc_keys.pop(0)
+                self._count -= 1
+            elif self._count >= self._capacity:
+                # Geometric resize amortizes reallocation over many inserts
+                self._capacity = min(self._capacity * 2, self.max_entries)
+                grown = np.zeros(
+                    (self._capacity, query_vec.shape[0]), dtype=np.float32
+                )
+                grown[: self._count] = self._embeddings[: self._count]
+                self._embeddings = grown
+
+            self._embeddings[self._count] = query_vec
+            self._responses.append(copy.deepcopy(response))
+            self._doc_keys.append(doc_key)
+            self._count += 1
+
+        # Persist outside the lock; the store writes from a background thread
+        if persist and self._store is not None:
+            key = hashlib.sha256(query_vec.tobytes()).hexdigest()
+            self._store.put(
+                "semantic",
+                key,
+                {"doc_key": [list(pair) for pair in doc_key], "response": response},
+                emb=query_vec.astype(np.float32).tobytes(),
+            )
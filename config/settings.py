@@ -1,54 +1,104 @@
 import os
+from functools import lru_cache
 from typing import List, Optional
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
-from pydantic import validator  # Import validator
+from pydantic import Field, field_validator
 
 # Load environment variables from .env file
 load_dotenv()
 
+PROJECT_ROOT = os.path.dirname(os.path.dirname(__file__))
+
+
+def _project_path(*parts: str) -> str:
+    return os.path.join(PROJECT_ROOT, *parts)
+
+
 class Settings(BaseSettings):
     """Application settings"""
-    
+
     # API settings
     api_host: str = "localhost"
     api_port: int = 8000
-    
-    # Upload settings
-    upload_dir: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "uploads")
-    
+
+    # Upload settings. Path and env-dependent defaults use default_factory
+    # so the os.getenv/os.path work runs per instantiation (i.e. once via
+    # get_settings), not at class definition during import
+    upload_dir: str = Field(default_factory=lambda: _project_path("data", "uploads"))
+
     # Document processing settings
     chunk_size: int = 1000
     chunk_overlap: int = 200
-    
+
     # Vector store settings
-    vector_store_path: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "faiss_index")
-    
-    # Chroma DB settings
-    chroma_db_impl: str = "duckdb+parquet"  # Default value
-    chroma_db_dir: str = "data/chroma_db"  # Default value
-    persist_directory: str = "data/chroma_db"  # Default value
-    
+    vector_store_path: str = Field(default_factory=lambda: _project_path("data", "faiss_index"))
+    # FAISS index type: "flat" (exact scan), "ivfpq" (compressed, approximate,
+    # ~16x less RAM, trains itself once enough vectors accumulate), "sq8"
+    # (exact scan over int8 codes, 4x less RAM/bandwidth), "sqfp16" (exact
+    # scan over float16 codes, 2x less RAM/disk, no training needed) or
+    # "hnsw" (graph-based, fast approximate search at higher RAM cost)
+    faiss_index_type: str = Field(default_factory=lambda: os.getenv("FAISS_INDEX_TYPE", "flat"))
+    # Run FAISS search on GPU 0 when a CUDA build of faiss is installed;
+    # ignored (with a CPU fallback) otherwise
+    use_gpu_faiss: bool = Field(
+        default_factory=lambda: os.getenv("USE_GPU_FAISS", "false").lower() in ("true", "1", "yes")
+    )
+
+    # Response cache persistence (exact-match + semantic caches)
+    cache_db_path: str = Field(default_factory=lambda: _project_path("data", "cache.db"))
+    # Cache replay gates, coupled to the sampling temperatures below. The
+    # exact-match caches only serve byte-identical repeats generated at or
+    # below this temperature; 0.0 means deterministic output only, so raise
+    # it if replaying sampled responses for exact repeats is acceptable
+    exact_cache_max_temperature: float = 0.0
+    # The semantic cache replays responses for paraphrased queries and is
+    # approximate by design, so it stays active at the default 0.7
+    # temperatures; set this below the model temperature to disable it
+    semantic_cache_max_temperature: float = 1.0
+
     # Local LLM settings
-    local_model_path: str = os.getenv("LOCAL_MODEL_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "models", "model.gguf"))
+    local_model_path: str = Field(
+        default_factory=lambda: os.getenv("LOCAL_MODEL_PATH", _project_path("models", "model.gguf"))
+    )
+    # Optional GGUF quantization target, e.g. "Q4_K_M" (empty = off).
+    # Decoding is memory-bandwidth bound, so Q4_K_M roughly doubles
+    # tokens/sec vs an FP16 model at small quality cost; when set and a
+    # llama.cpp quantize binary is on PATH, an unquantized (F16/F32/BF16)
+    # model file is quantized once and reused. Off by default because most
+    # downloaded GGUFs are already quantized and the one-time pass is slow.
+    local_model_quant: str = Field(default_factory=lambda: os.getenv("LOCAL_MODEL_QUANT", ""))
     context_size: int = 2048
     max_tokens: int = 512
+    # Sampling temperature; also gates caching - see the
+    # *_cache_max_temperature settings above
     temperature: float = 0.7
-    
+
     # Azure LLM settings
-    azure_api_key: Optional[str] = os.getenv("AZURE_OPENAI_API_KEY", os.getenv("OPENAI_API_KEY"))
-    azure_endpoint: Optional[str] = os.getenv("AZURE_OPENAI_ENDPOINT")
-    azure_deployment: str = os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4o")
-    azure_api_version: str = os.getenv("AZURE_OPENAI_API_VERSION", "2024-08-06")
+    azure_api_key: Optional[str] = Field(
+        default_factory=lambda: os.getenv("AZURE_OPENAI_API_KEY", os.getenv("OPENAI_API_KEY"))
+    )
+    azure_endpoint: Optional[str] = Field(default_factory=lambda: os.getenv("AZURE_OPENAI_ENDPOINT"))
+    azure_deployment: str = Field(default_factory=lambda: os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4o"))
+    azure_api_version: str = Field(
+        default_factory=lambda: os.getenv("AZURE_OPENAI_API_VERSION", "2024-08-06")
+    )
     azure_max_tokens: int = 1024
+    # Sampling temperature; also gates caching - see the
+    # *_cache_max_temperature settings above
     azure_temperature: float = 0.7
-    
+    # Max concurrent prompts coalesced into one Azure request. Micro-batching
+    # uses the legacy completions API, which chat-only deployments (gpt-4o,
+    # the default above) reject - only raise this for deployments that still
+    # serve the completions endpoint
+    azure_max_batch: int = Field(default_factory=lambda: int(os.getenv("AZURE_MAX_BATCH", "1")))
+
     # Additional OpenAI compatible settings
-    openai_api_key: Optional[str] = os.getenv("OPENAI_API_KEY")
-    openai_api_base: Optional[str] = os.getenv("OPENAI_API_BASE")
-    openai_deployment_name: Optional[str] = os.getenv("OPENAI_DEPLOYMENT_NAME")
-    openai_api_version: Optional[str] = os.getenv("OPENAI_API_VERSION")
-    openai_api_type: Optional[str] = os.getenv("OPENAI_API_TYPE")
+    openai_api_key: Optional[str] = Field(default_factory=lambda: os.getenv("OPENAI_API_KEY"))
+    openai_api_base: Optional[str] = Field(default_factory=lambda: os.getenv("OPENAI_API_BASE"))
+    openai_deployment_name: Optional[str] = Field(default_factory=lambda: os.getenv("OPENAI_DEPLOYMENT_NAME"))
+    openai_api_version: Optional[str] = Field(default_factory=lambda: os.getenv("OPENAI_API_VERSION"))
+    openai_api_type: Optional[str] = Field(default_factory=lambda: os.getenv("OPENAI_API_TYPE"))
     
     # Query router settings
     word_limit: int = 20
@@ -61,12 +111,24 @@ class Settings(BaseSettings):
     # General settings
     verbose: bool = False  # Default value
 
-    @validator("verbose", pre=True)
+    @field_validator("verbose", mode="before")
+    @classmethod
     def parse_verbose(cls, value):
         if isinstance(value, str):
             return value.lower() in ("true", "1", "yes")
         return bool(value)
-    
+
     class Config:
         env_file = ".env"
         extra = "allow"  # Allow extra fields
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Process-wide Settings singleton.
+
+    Constructing Settings re-reads .env and walks os.getenv for every field;
+    callers should go through this factory instead of instantiating directly.
+    """
+    return Settings()
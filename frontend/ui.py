@@ -1,5 +1,7 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+import orjson
 import os
 import json
 import time
@@ -9,10 +11,35 @@ from datetime import datetime
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config.settings import Settings
+from config.settings import get_settings
+
+
+# Streamlit reruns this script top-to-bottom on every widget interaction;
+# cache_resource keeps the settings parse and the HTTP connection pool
+# alive across reruns instead of rebuilding them each time
+@st.cache_resource
+def get_cached_settings():
+    return get_settings()
+
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """Pooled HTTP session so queries reuse keep-alive connections."""
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+    return session
+
+
+@st.cache_data(ttl=30)
+def fetch_documents():
+    """Document list for the sidebar, cached for 30s between reruns."""
+    response = get_session().get(f"{API_URL}/api/documents")
+    response.raise_for_status()
+    return response.json()["documents"]
+
 
 # Configuration
-settings = Settings()
+settings = get_cached_settings()
 API_URL = f"http://{settings.api_host}:{settings.api_port}"
 
 # Page configuration
@@ -43,53 +70,40 @@ with st.sidebar:
     
     if uploaded_file is not None:
         with st.spinner("Processing document..."):
-            # Save the uploaded file temporarily
-            file_path = os.path.join("temp", uploaded_file.name)
-            os.makedirs("temp", exist_ok=True)
-            
-            with open(file_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            
-            # Send the file to the API
+            # The upload widget already holds the bytes in memory; POST the
+            # file object straight to the API instead of spooling a temp
+            # copy to disk and reading it back
             try:
-                with open(file_path, "rb") as f:
-                    response = requests.post(
-                        f"{API_URL}/api/upload",
-                        files={"file": (uploaded_file.name, f, "application/pdf")}
-                    )
-                    
+                uploaded_file.seek(0)
+                response = get_session().post(
+                    f"{API_URL}/api/upload",
+                    files={"file": (uploaded_file.name, uploaded_file, "application/pdf")}
+                )
+
                 if response.status_code == 200:
                     result = response.json()
                     st.success(f"Document processed into {result['chunks']} chunks!")
                 else:
                     st.error(f"Error: {response.text}")
-            
+
             except Exception as e:
                 st.error(f"Error: {str(e)}")
-            
-            finally:
-                # Clean up
-                if os.path.exists(file_path):
-                    os.remove(file_path)
     
     st.header("Documents")
     if st.button("Refresh Document List"):
-        with st.spinner("Loading documents..."):
-            try:
-                response = requests.get(f"{API_URL}/api/documents")
-                if response.status_code == 200:
-                    docs = response.json()["documents"]
-                    if docs:
-                        for doc in docs:
-                            doc_name = doc["filename"]
-                            doc_size = doc["size_kb"]
-                            st.text(f"📄 {doc_name} ({doc_size} KB)")
-                    else:
-                        st.info("No documents uploaded yet")
-                else:
-                    st.error("Failed to load documents")
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
+        fetch_documents.clear()
+    with st.spinner("Loading documents..."):
+        try:
+            docs = fetch_documents()
+            if docs:
+                for doc in docs:
+                    doc_name = doc["filename"]
+                    doc_size = doc["size_kb"]
+                    st.text(f"📄 {doc_name} ({doc_size} KB)")
+            else:
+                st.info("No documents uploaded yet")
+        except Exception as e:
+            st.error(f"Error: {str(e)}")
     
     st.header("Settings")
     force_route = st.radio(
@@ -122,9 +136,13 @@ if submit_button and query:
     # Send request to API
     with st.spinner("Generating answer..."):
         try:
-            response = requests.post(
+            # orjson encode instead of requests' stdlib json path; the
+            # (possibly large, gzipped) response is decoded transparently
+            # by the session since requests advertises Accept-Encoding
+            response = get_session().post(
                 f"{API_URL}/api/query",
-                json=request_data
+                data=orjson.dumps(request_data),
+                headers={"Content-Type": "application/json"}
             )
             
             if response.status_code == 200: